@@ -20,7 +20,8 @@ Created on Apr 12, 2023
 import math
 from enum import Enum, unique
 
-from amaranth import Elaboratable, Signal, Module, Const, Array, unsigned, ResetSignal
+from amaranth import Elaboratable, Signal, Module, Const, Cat, Mux, Array, unsigned, ResetSignal
+from amaranth.hdl.mem import Memory
 from amaranth.build import Platform
 from amaranth.asserts import Assert, Assume, Cover
 
@@ -33,27 +34,44 @@ from neptune.testing.history import History
 # FSM states
 @unique
 class DiscriminatorState(Enum):
-    PowerUp                 = 0 
+    PowerUp                 = 0
     Init                    = 1
     CalculateDiffFromTarget = 2
     Compare                 = 3
-    MovedToNextCheckBounds  = 4
-    DetectedValidNote       = 5
-    DisplayResult           = 6
-    
-    
+    DetectedValidNote       = 4
+    DisplayResult           = 5
+    LatchTestValue          = 6
+
+
+def oneHotState(state:DiscriminatorState) -> Const:
+    '''
+        The state register is one-hot encoded -- one FF per state, bit index
+        == enum value -- so next-state logic is a single AND/OR per bit rather
+        than a wide decode of a dense binary state.
+    '''
+    return Const(1 << state.value, len(DiscriminatorState))
+
 
     
 class Discriminator(Elaboratable):
     '''
-        The Discriminator does all the heavy lifting in Neptune: its what tells the 
-        difference between frequencies of interest and irrelevant input, and what 
+        The Discriminator does all the heavy lifting in Neptune: its what tells the
+        difference between frequencies of interest and irrelevant input, and what
         determines "proximity".
-        
-        Currently implements functionality through an FSM.
-    
+
+        Compares the edge count against every note of interest in parallel --
+        one constant subtractor per note -- so a full scan of the tuning takes a
+        single cycle, followed by a small FSM for proximity classification.
+
+        The original sequential search (one note tested per pass through the FSM)
+        is preserved in elaborateStateMachine, and used for tunings too big
+        to sensibly unroll (see specialized()).
+
     '''
     
+    # beyond this many notes, one comparator per note stops being a bargain
+    MaxParallelScanNotes = 8
+    
     def __init__(self, usingTuning:Tuning, # the set of notes we care about
                  samplingDurationSeconds:float=config.SamplingDurationDefault, # the time over which we're gathering input pulse counts
                  detectionWindowHz:int=config.MaxDetectionHzWindowDefault # the window for "valid" and "close" detection, in Hz
@@ -75,9 +93,16 @@ class Discriminator(Elaboratable):
         # so real maxCount is:
         maxCount = (maxFreqHz + countJitterHeadroomHz) * samplingDurationSeconds
         
-        # and for this we need this many bits, tops
-        countBits = math.ceil(math.log2(round(maxCount)))
-        self.input_bits = countBits
+        # and for this we need this many bits, tops.  bit_length() rather
+        # than ceil(log2()): no FP rounding surprises right at powers of
+        # two (where log2 would short us a bit)
+        maxCountInt = int(round(maxCount))
+        self.input_bits = max(1, maxCountInt.bit_length())
+        
+        # the detection window geometry is also fixed at construction; cache
+        # the values as plain ints (see the detectionWindow* properties)
+        self._windowSpan = math.ceil(detectionWindowHz * samplingDurationSeconds)
+        self._windowMid = math.ceil(self._windowSpan / 2)
         
         #### INPUT ####
         # edge_count: count of ticks over SAMPLETIME
@@ -97,22 +122,50 @@ class Discriminator(Elaboratable):
         self.match_exact = Signal()
         self.match_high = Signal()
         self.match_far = Signal()
-        
+
+        # the tuning is immutable once we're constructed, so figure out the
+        # test order and per-note count thresholds once, here, rather than
+        # redoing the arithmetic on every elaboration
+        self.notesDescending = list(self.tuning.descending)
+        self.noteMaxCounts = [self.maxCountForNote(n) for n in self.notesDescending]
+        
+        # the whole scan -- sequential and parallel flavours both -- leans on
+        # these thresholds being strictly descending, so fail loudly at
+        # construction if a tuning ever violates that
+        assert all(self.noteMaxCounts[i] > self.noteMaxCounts[i+1]
+                   for i in range(len(self.noteMaxCounts) - 1)), \
+               'note count thresholds must be strictly descending'
+        
+        # delta-encode the thresholds: first entry is the anchor, each
+        # following entry the (small, positive) step down to the next note.
+        # the parallel comparator bank chains its subtracts off these
+        self.noteCountDeltas = [self.noteMaxCounts[0]] + [
+            self.noteMaxCounts[i-1] - self.noteMaxCounts[i]
+            for i in range(1, len(self.noteMaxCounts))]
+        
+        # which elaboration path to use: small tunings (like the
+        # production StandardGuitarTuning) get the fully unrolled
+        # parallel compare bank, anything larger falls back to the
+        # sequential FSM search to keep the comparator count in check.
+        # still overridable after construction, e.g. for the formal
+        # harnesses that exercise the FSM path explicitly
+        self.parallelScan = len(self.tuning) <= self.MaxParallelScanNotes
+
     def ports(self):
         return [self.edge_count, self.note, self.match_exact, self.match_high, self.match_far]
     
     
     @property 
     def detectionWindowSpanCount(self) -> int:
-        # detectionWindowHz must be adjusted to account for the 
-        # desired sampling duration
-        return math.ceil(self.detectionWindowHz * self.samplingDurationSeconds)
+        # detectionWindowHz adjusted to account for the desired sampling
+        # duration -- precomputed in __init__
+        return self._windowSpan
     
     @property 
     def detectionWindowMidPoint(self) -> int:
         # midway point of the span is useful for a number of reasons,
         # notably that that is where our target frequency lies
-        return (math.ceil(self.detectionWindowSpanCount/2))
+        return self._windowMid
     
     
 
@@ -133,17 +186,30 @@ class Discriminator(Elaboratable):
     
     
         
+    @classmethod
+    def specialized(cls, usingTuning:Tuning, **kwargs):
+        '''
+            Factory returning a Discriminator specialized for the tuning at
+            hand.  The constructor already picks the scan flavour from the
+            tuning size, so this is now just an explicitly-named way to say
+            "give me whatever suits this tuning".
+        '''
+        return cls(usingTuning, **kwargs)
+    
     def elaborate(self, platform:Platform):
         m = Module()
-        self.elaborateStateMachine(m, platform)
+        if self.parallelScan:
+            self.elaborateParallel(m, platform)
+        else:
+            self.elaborateStateMachine(m, platform)
         return m
-        
+
     
     
     def elaborateStateMachine(self, m:Module, platform:Platform):
         
         
-        curState = Signal(DiscriminatorState) # FSM current state
+        curState = Signal(len(DiscriminatorState)) # FSM current state, one-hot: one FF per state
         
         maxNoMatchesBeforeErase = 31
         noMatchCount = Signal(range(maxNoMatchesBeforeErase+1))
@@ -153,6 +219,21 @@ class Discriminator(Elaboratable):
         # input edge count itself, to ensure we don't wrap
         subtractResult = Signal(unsigned(self.input_bits))
         
+        # the threshold count selected for the note under test, registered a
+        # cycle ahead of the subtraction so the ROM select and the subtract
+        # carry chain sit in separate clock cycles
+        selectedCount = Signal(unsigned(self.input_bits))
+        
+        # one full-width subtractor, instantiated once here in the comb
+        # domain and shared by whichever state wants the result -- rather
+        # than letting each state conjure its own carry chain
+        subtractRaw = Signal(unsigned(self.input_bits))
+        
+        # once Compare passes, the distance is known to fit within the
+        # detection window span, so downstream states work from this narrowed
+        # copy and keep their adders span-sized instead of input_bits wide
+        subtractResultNarrow = Signal(range(self.detectionWindowSpanCount + 1))
+        
         # in cases where the subtraction above is "close enough" -- ie within our
         # detection window span, further processing will occur
         # this smaller value is guaranteed to have a max value equal to the 
@@ -163,209 +244,308 @@ class Discriminator(Elaboratable):
         inputFreqHigher = Signal()
         
         curNoteIndex = Signal(range(len(self.tuning)))
-        m.d.sync += curState.eq(DiscriminatorState.PowerUp)
+        m.d.sync += curState.eq(oneHotState(DiscriminatorState.PowerUp))
         
-        # these two arrays get used within the actual verilog, so they are Array objects
-        
-        # the tests we'll be doing, highest frequency first
-        TestsDescending = Array(
-            list(map(lambda n: Const(self.maxCountForNote(n), unsigned(self.input_bits)), 
-                     self.tuning.descending)))
-        
-        # the notes related to each test, in the same order
-        NotesSortedByTestIdx = Array(
-            list(map(lambda x: x.note, self.tuning.descending))
-            )
+        # the tests we'll be doing, highest frequency first: a ROM -- a
+        # Memory with a combinational read port -- rather than an Array,
+        # which would become a wide variable-select mux.  This way synthesis
+        # is free to map the constant table onto ROM/LUTRAM primitives.
+        testsRom = Memory(width=self.input_bits, depth=len(self.noteMaxCounts),
+                          init=self.noteMaxCounts)
+        m.submodules.tests_rom = testsReadPort = testsRom.read_port(domain='comb')
+        m.d.comb += testsReadPort.addr.eq(curNoteIndex)
+        m.d.comb += subtractRaw.eq(selectedCount - self.edge_count)
         
         
         # the actual FSM dispatcher
-        with m.Switch(curState):
-            with m.Case(DiscriminatorState.PowerUp):
-                m.d.sync += [
-                     noMatchCount.eq(0),
-                     curState.eq(DiscriminatorState.Init)
-                ]
+        with m.If(curState[DiscriminatorState.PowerUp.value]):
+            m.d.sync += [
+                 noMatchCount.eq(0),
+                 curState.eq(oneHotState(DiscriminatorState.Init))
+            ]
                 
             
-            # init state
-            with m.Case(DiscriminatorState.Init):
-                m.d.sync += [
-                    curNoteIndex.eq(0), # begin search at start of array
-                    curState.eq(DiscriminatorState.CalculateDiffFromTarget) # move into search state
-                ]
+        # init state
+        with m.If(curState[DiscriminatorState.Init.value]):
+            m.d.sync += [
+                curNoteIndex.eq(0), # begin search at start of array
+                curState.eq(oneHotState(DiscriminatorState.LatchTestValue)) # move into search state
+            ]
                 
-                with m.If(noMatchCount == maxNoMatchesBeforeErase):
-                    m.d.sync += self.note.eq(notes.Scale.NA)
+            with m.If(noMatchCount == maxNoMatchesBeforeErase):
+                m.d.sync += self.note.eq(notes.Scale.NA)
                 
-            # calculation state
-            with m.Case(DiscriminatorState.CalculateDiffFromTarget):
-                # basically just load difference into subtractResult
-                # and move on
-                m.d.sync += [
-                    subtractResult.eq(TestsDescending[curNoteIndex] - self.edge_count),
-                    curState.eq(DiscriminatorState.Compare)
-                ]
+        # latch state: register the selected threshold on its own, so the
+        # subtract in the next state starts from a flop instead of the ROM mux
+        with m.If(curState[DiscriminatorState.LatchTestValue.value]):
+            m.d.sync += [
+                selectedCount.eq(testsReadPort.data),
+                curState.eq(oneHotState(DiscriminatorState.CalculateDiffFromTarget))
+            ]
                 
+        # calculation state
+        with m.If(curState[DiscriminatorState.CalculateDiffFromTarget.value]):
+            # basically just register the shared subtractor's output
+            # and move on
+            m.d.sync += [
+                subtractResult.eq(subtractRaw),
+                curState.eq(oneHotState(DiscriminatorState.Compare))
+            ]
                 
                 
-            with m.Case(DiscriminatorState.Compare):
-                # check if difference is smaller than our threshold window
-                with m.If(subtractResult <= self.detectionWindowSpanCount):
-                    # if it is, we're close enough to call this a valid note
-                    m.d.sync += [ 
-                        self.note.eq(NotesSortedByTestIdx[curNoteIndex]), # set output note to Scale.XXX
-                        curState.eq(DiscriminatorState.DetectedValidNote) # move to processing
-                    ]
-                with m.Else():
-                    # if not, move to next note 
+                
+        with m.If(curState[DiscriminatorState.Compare.value]):
+            # check if difference is smaller than our threshold window
+            with m.If(subtractResult <= self.detectionWindowSpanCount):
+                # if it is, we're close enough to call this a valid note
+                m.d.sync += [ 
+                    subtractResultNarrow.eq(subtractResult), # bounded by the window span now
+                    curState.eq(oneHotState(DiscriminatorState.DetectedValidNote)) # move to processing
+                ]
+                # set output note to Scale.XXX -- the index->note decode is
+                # over elaboration-time constants, so emit an explicit Switch
+                # rather than an Array (which lowers to a variable-select mux)
+                with m.Switch(curNoteIndex):
+                    for i, aNote in enumerate(self.notesDescending):
+                        with m.Case(i):
+                            m.d.sync += self.note.eq(aNote.note)
+            with m.Else():
+                # no match: the bounds check on the next index is only a
+                # comparison against a narrow constant, so do it right here
+                # rather than burning a cycle in a dedicated state
+                with m.If((curNoteIndex + 1) < Const(len(self.tuning))):
+                    # more notes to test: move to the next one
                     m.d.sync += [
                         curNoteIndex.eq(curNoteIndex + 1),
-                        curState.eq(DiscriminatorState.MovedToNextCheckBounds)
+                        curState.eq(oneHotState(DiscriminatorState.LatchTestValue))
                     ]
-                    
-                        
-                        
-            with m.Case(DiscriminatorState.MovedToNextCheckBounds):
-                # didn't match last check
-                # make sure current note index is valid first
-                with m.If(curNoteIndex < Const(len(self.tuning))):
-                    # yep.
-                    # we haven't check all in tuning yet, so this current note 
-                    # index is valid: do diff calculation
-                    m.d.sync += curState.eq(DiscriminatorState.CalculateDiffFromTarget)
                 with m.Else():
-                    # we're out of bounds, back to init but also make note 
-                    # that we've done another full scan without a match
-                    m.d.sync += [
-                        curState.eq(DiscriminatorState.Init),
-                        noMatchCount.eq(noMatchCount + 1)
-                    ]
+                    # that was the last one: back to init but also make note 
+                    # that we've done another full scan without a match.
+                    # the counter saturates rather than wrapping, so the
+                    # display-erase in Init doesn't periodically re-fire
+                    m.d.sync += curState.eq(oneHotState(DiscriminatorState.Init))
+                    with m.If(noMatchCount != maxNoMatchesBeforeErase):
+                        m.d.sync += noMatchCount.eq(noMatchCount + 1)
                         
                 
                         
-            # found a valid note state
-            with m.Case(DiscriminatorState.DetectedValidNote):
-                # we are close enough to some note to call it "detected" and display something
-                #
-                # what would be nice is to have a unified set of tests regardless of if we are 
-                # off by +ve or -ve amount
+        # found a valid note state
+        with m.If(curState[DiscriminatorState.DetectedValidNote.value]):
+            # we are close enough to some note to call it "detected" and display something
+            #
+            # what would be nice is to have a unified set of tests regardless of if we are 
+            # off by +ve or -ve amount
                 
-                # to do this, math will come in handy.
+            # to do this, math will come in handy.
                 
-                # the situation: subtractResult holds
-                # (exactCountForNote + windowHalfSpan) - actualEdgeCount
-                # e.g. for 330Hz and 32Hz window
-                #  subtractResult = (330 + 15) - actualCount
-                #
-                #  So if result of subtraction was:
-                #  1* windowHalfSpan -> we are exactly on the target note, yayz!
-                #  2* [0, windowHalfSpan[ -> we are somewhat above the target note freq (0 is way above, and higher value is closer)
-                #  3* ]windowHalfSpan, windowSpan] -> we are somewhat below target note freq (windowSpan is way above, and lower value is closer)
+            # the situation: subtractResult holds
+            # (exactCountForNote + windowHalfSpan) - actualEdgeCount
+            # e.g. for 330Hz and 32Hz window
+            #  subtractResult = (330 + 15) - actualCount
+            #
+            #  So if result of subtraction was:
+            #  1* windowHalfSpan -> we are exactly on the target note, yayz!
+            #  2* [0, windowHalfSpan[ -> we are somewhat above the target note freq (0 is way above, and higher value is closer)
+            #  3* ]windowHalfSpan, windowSpan] -> we are somewhat below target note freq (windowSpan is way above, and lower value is closer)
                 
-                # to get tests unified, we flip the case 3 value by doing
-                #    windowSpan - subtractResult
-                # such that anything close to target freq (ie windowHalfSpan) stays close to 
-                # there, and anything "far away" get's shifted toward 0.  After this
-                #   0 <- far away ... higgher closer -> halfspan == target
-                # regardless of if we were above or below.
-                with m.If(subtractResult <= self.detectionWindowMidPoint):
-                    # either on or above target note, our proximity result is simply the subtractResult
-                    # note we were higher (or equal)
-                    m.d.sync += [
-                        readingProximityResult.eq(subtractResult), # proxim value is simply the result of the subtraction
-                        inputFreqHigher.eq(1) # remember that measured freq is higher or equal
-                    ]
-                with m.Else():
-                    # we are below target note, so we do that flip using a subtraction
-                    # note we were lower
-                    m.d.sync += [
-                        readingProximityResult.eq(self.detectionWindowSpanCount - subtractResult),
-                        inputFreqHigher.eq(0)
-                    ]
-                
-                # move to next state, and reset the noMatchCount
+            # to get tests unified, we flip the case 3 value by doing
+            #    windowSpan - subtractResult
+            # such that anything close to target freq (ie windowHalfSpan) stays close to 
+            # there, and anything "far away" get's shifted toward 0.  After this
+            #   0 <- far away ... higgher closer -> halfspan == target
+            # regardless of if we were above or below.
+            with m.If(subtractResultNarrow <= self.detectionWindowMidPoint):
+                # either on or above target note, our proximity result is simply the subtractResult
+                # note we were higher (or equal)
                 m.d.sync += [
-                    curState.eq(DiscriminatorState.DisplayResult),
-                    noMatchCount.eq(0)
+                    readingProximityResult.eq(subtractResultNarrow), # proxim value is simply the result of the subtraction
+                    inputFreqHigher.eq(1) # remember that measured freq is higher or equal
+                ]
+            with m.Else():
+                # we are below target note, so we do that flip using a subtraction
+                # note we were lower
+                m.d.sync += [
+                    readingProximityResult.eq(self.detectionWindowSpanCount - subtractResultNarrow),
+                    inputFreqHigher.eq(0)
                 ]
                 
-            with m.Case(DiscriminatorState.DisplayResult):
-                #
-                #  Here we take all our processed results and actually 
-                # write the output values that are our discriminator reports
-                # on matches to the outside world/upper layers.
+            # move to next state, and reset the noMatchCount
+            m.d.sync += [
+                curState.eq(oneHotState(DiscriminatorState.DisplayResult)),
+                noMatchCount.eq(0)
+            ]
                 
-                # At this stage, we have:
-                # 
-                #  * a readingProximityResult value between 0 and windowHalfSpan
-                #    where greater value ==> closer to target
-                #  * a inputFreqHigher which tells us if our error is a freq that
-                #    is higher than target or not (lower)
+        with m.If(curState[DiscriminatorState.DisplayResult.value]):
+            #
+            #  Here we take all our processed results and actually 
+            # write the output values that are our discriminator reports
+            # on matches to the outside world/upper layers.
                 
+            # At this stage, we have:
+            # 
+            #  * a readingProximityResult value between 0 and windowHalfSpan
+            #    where greater value ==> closer to target
+            #  * a inputFreqHigher which tells us if our error is a freq that
+            #    is higher than target or not (lower)
                 
-                    
-                # we'll use a simple rule for determining proximity:
-                #  - anything really close to halfspan -> "exact match"
-                #  - otherwise, not exact but any "proximity" less that halfspan/2 is "far away"
-                with m.If(readingProximityResult >=  (self.detectionWindowMidPoint - 1)):
-                    m.d.sync += [
-                        self.match_exact.eq(1),
-                        self.match_far.eq(0)
-                    ]
-                    
-                with m.Else():
-                    # near or far but not considered an exact match, no matter what
-                    m.d.sync +=  self.match_exact.eq(0)
-                    
-                    with m.If(readingProximityResult <= math.ceil(self.detectionWindowMidPoint/2)):
-                        # call this far away
-                        m.d.sync += self.match_far.eq(1)
-                            
-                    with m.Else():
-                        # pretty close
-                        m.d.sync += self.match_far.eq(0)     
-                        
                 
+                    
+            # we'll use a simple rule for determining proximity:
+            #  - anything really close to halfspan -> "exact match"
+            #  - otherwise, not exact but any "proximity" less that halfspan/2 is "far away"
+            # both comparisons are against constants, so rather than a
+            # priority mux chain, evaluate them in parallel and register
+            # the flags directly
+            isExact = readingProximityResult >= (self.detectionWindowMidPoint - 1)
+            isFar = (~isExact) & (readingProximityResult <= math.ceil(self.detectionWindowMidPoint/2))
                 
-                # after all this, we'll go back to init.
-                # also report if measurement is higher or lower than target
-                # by mapping the inputFreqHigher bit directly
-                m.d.sync += [
-                    curState.eq(DiscriminatorState.Init), # we'll
-                    self.match_high.eq(inputFreqHigher)
-                ]
+            # after all this, we'll go back to init.
+            # also report if measurement is higher or lower than target
+            # by mapping the inputFreqHigher bit directly
+            m.d.sync += [
+                self.match_exact.eq(isExact),
+                self.match_far.eq(isFar),
+                self.match_high.eq(inputFreqHigher),
+                curState.eq(oneHotState(DiscriminatorState.Init))
+            ]
                                
             
-            with m.Default():
-                # catch any weird start-up state, and shunt it 
-                # to reset
-                m.d.sync += curState.eq(DiscriminatorState.PowerUp)
         
 
         
         
         
     def elaborateParallel(self, m:Module, platform:Platform):
-        
-        m.d.sync += self.note.eq(notes.Scale.NA) 
-        
-        distanceValue = Signal(range(self.detectionWindowHz + 1))
-        
-        for aNote in self.tuning.descending:
-            
-            compareCount = Const(self.maxCountForNote(aNote))
-            
-            subtractResult = Signal(self.input_bits)
-            
-            m.d.comb += subtractResult.eq(compareCount - self.edge_count)
-            with m.If(subtractResult <= self.detectionWindowHz):
-                m.d.sync += self.note.eq(aNote.note)
-                m.d.comb += distanceValue.eq(subtractResult)
-                
-        
-        # at this stage self.note has NA or a note within window
-        # and distanceValue has the last delta value
-        
+
+        curState = Signal(len(DiscriminatorState)) # FSM current state, one-hot: one FF per state
+
+        maxNoMatchesBeforeErase = 31
+        noMatchCount = Signal(range(maxNoMatchesBeforeErase+1))
+
+        # the distance from target for whichever note matched, latched from
+        # the comparator bank below.  Only loaded when a match fired, which
+        # guarantees the value fits in the detection window span -- so the
+        # register (and everything downstream) only needs those few bits
+        subtractResult = Signal(range(self.detectionWindowSpanCount + 1))
+
+        m.d.sync += curState.eq(oneHotState(DiscriminatorState.PowerUp))
+
+        # the comparator bank: one constant subtractor per note of interest,
+        # all purely combinational, so every note is tested on every cycle.
+        # Notes are handled highest frequency first, same priority as the
+        # sequential search.
+        notesDescending = self.notesDescending
+
+        # successive thresholds differ only by small deltas, so rather than
+        # N independent full-width subtractors, anchor on the first threshold
+        # and derive each following distance by subtracting the (constant)
+        # delta from the previous one -- modular arithmetic keeps this exact,
+        # and synthesis gets one wide carry chain plus N-1 narrow decrements
+        diffs = []
+        matches = []
+        prevDiff = None
+        for aNote, delta in zip(notesDescending, self.noteCountDeltas):
+            diff = Signal(unsigned(self.input_bits), name=f'diff_{aNote.name}')
+            match = Signal(name=f'match_{aNote.name}')
+            if prevDiff is None:
+                # the anchor: full (threshold - edge_count) subtract
+                m.d.comb += diff.eq(Const(delta, unsigned(self.input_bits))
+                                    - self.edge_count)
+            else:
+                m.d.comb += diff.eq(prevDiff
+                                    - Const(delta, unsigned(self.input_bits)))
+            m.d.comb += match.eq(diff <= self.detectionWindowSpanCount)
+            prevDiff = diff
+            diffs.append(diff)
+            matches.append(match)
+
+        # the one-hot(ish) match vector, reduced to "anything at all?"
+        anyMatch = Signal()
+        m.d.comb += anyMatch.eq(Cat(*matches).any())
+
+
+        # the actual FSM dispatcher
+        with m.If(curState[DiscriminatorState.PowerUp.value]):
+            m.d.sync += [
+                 noMatchCount.eq(0),
+                 curState.eq(oneHotState(DiscriminatorState.Init))
+            ]
+
+
+        # scan state -- a complete scan of the tuning is now a single cycle
+        with m.If(curState[DiscriminatorState.Init.value]):
+            with m.If(anyMatch):
+                # something matched: priority-select the note.
+                # this cascade of m.If/m.Elif is over python-level constants,
+                # so it folds into a simple priority encoder
+                m.d.sync += [
+                    noMatchCount.eq(0),
+                    curState.eq(oneHotState(DiscriminatorState.DetectedValidNote)) # move to processing
+                ]
+                with m.If(matches[0]):
+                    m.d.sync += [
+                        self.note.eq(notesDescending[0].note),
+                        subtractResult.eq(diffs[0])
+                    ]
+                for i in range(1, len(notesDescending)):
+                    with m.Elif(matches[i]):
+                        m.d.sync += [
+                            self.note.eq(notesDescending[i].note),
+                            subtractResult.eq(diffs[i])
+                        ]
+            with m.Else():
+                # nothing matched this scan; keep scanning.  The miss counter
+                # saturates: once it hits the limit we erase the display and
+                # hold there -- no wraparound, so no periodic re-erase and no
+                # increment logic active once saturated
+                m.d.sync += curState.eq(oneHotState(DiscriminatorState.Init))
+                with m.If(noMatchCount == maxNoMatchesBeforeErase):
+                    m.d.sync += self.note.eq(notes.Scale.NA)
+                with m.Else():
+                    m.d.sync += noMatchCount.eq(noMatchCount + 1)
+
+
+
+        # found a valid note state: classify proximity and report,
+        # all in one cycle
+        with m.If(curState[DiscriminatorState.DetectedValidNote.value]):
+            # we are close enough to some note to call it "detected" and display something
+            #
+            # subtractResult holds
+            # (exactCountForNote + windowHalfSpan) - actualEdgeCount
+            # so:
+            #  1* windowHalfSpan -> we are exactly on the target note
+            #  2* [0, windowHalfSpan[ -> we are somewhat above the target note freq
+            #  3* ]windowHalfSpan, windowSpan] -> we are somewhat below target note freq
+            #
+            # to get tests unified, we flip the case 3 value (windowSpan - subtractResult)
+            # such that, regardless of being above or below,
+            #   0 <- far away ... higher closer -> halfspan == target
+            # See elaborateStateMachine for the full derivation.
+            inputFreqHigher = subtractResult <= self.detectionWindowMidPoint
+            proximity = Mux(inputFreqHigher,
+                            subtractResult,
+                            self.detectionWindowSpanCount - subtractResult)
+
+            # we'll use a simple rule for determining proximity:
+            #  - anything really close to halfspan -> "exact match"
+            #  - otherwise, not exact but any "proximity" less that halfspan/2 is "far away"
+            isExact = proximity >= (self.detectionWindowMidPoint - 1)
+            isFar = (~isExact) & (proximity <= math.ceil(self.detectionWindowMidPoint/2))
+
+            # register all the reports in the same cycle and go straight
+            # back to scanning -- no intermediate DisplayResult stop, and no
+            # registered proximity/higher state to carry between cycles
+            m.d.sync += [
+                self.match_exact.eq(isExact),
+                self.match_far.eq(isFar),
+                self.match_high.eq(inputFreqHigher),
+                curState.eq(oneHotState(DiscriminatorState.Init))
+            ]
+
+
+
         
 
 
@@ -397,12 +577,13 @@ def simulate(usingTuning:Tuning, samplingDurationSecs:float=1.0):
         
     def tunerTestRange():
         baseFreq = 305
-        for i in range(0,68,3):
-            yield from setEdgeCountToFrequency(baseFreq + i)
-            yield Delay(40e-3)
-            
-        for i in range(0,75,3):
-            yield from setEdgeCountToFrequency((baseFreq + 50) - i)
+        # batch-compute every edge_count value upfront -- keeps the
+        # per-sample generator body down to a set and a delay
+        sweepFreqs = [baseFreq + i for i in range(0,68,3)]
+        sweepFreqs += [(baseFreq + 50) - i for i in range(0,75,3)]
+        counts = [round(f * samplingDurationSecs) for f in sweepFreqs]
+        for c in counts:
+            yield dut.edge_count.eq(c)
             yield Delay(40e-3)
         
     
@@ -21,7 +21,7 @@ switched cathode.
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
-from amaranth import Signal, Elaboratable, Module
+from amaranth import Signal, Elaboratable, Module, Mux
 from amaranth.build import Platform
 from amaranth.sim import Delay
 from neptune.display.sevensegment import SevenSegment
@@ -59,23 +59,26 @@ class DualSevenSegmentDisplay(Elaboratable):
         m.submodules.notedisplay = notedisplay = SevenSegment(NoteSprites())
         m.submodules.proxdisplay = proxdisplay = SevenSegment(ProximitySprites())
         
-        m.d.sync += [
+        # the sub-display lookups are combinational now, so feed them the
+        # raw inputs and register just once, at the segments output --
+        # one sync stage through the display instead of two
+        m.d.comb += [
             notedisplay.value.eq(self.valueNote),
             proxdisplay.value.eq(self.valueProxim)
         ]
             
         
-        m.d.sync += self.proximitySelect.eq(1)
+        # flip the cathode select every cycle -- an explicit invert, rather
+        # than a default assignment overridden inside the If below, which
+        # read as if the select could stick high
+        m.d.sync += self.proximitySelect.eq(~self.proximitySelect)
             
-        with m.If(self.proximitySelect):
-            m.d.sync += self.proximitySelect.eq(0) # flip it
-            with m.If(self.valueNote == notes.Scale.NA):
-                m.d.sync += self.segments.eq(notedisplay.segments)
-            with m.Else():
-                m.d.sync += self.segments.eq(proxdisplay.segments)
-                
-        with m.Else():
-            m.d.sync += self.segments.eq(notedisplay.segments)
+        # proximity shows on the select half-cycle, unless there's no note
+        # detected at all (in which case both halves show the note display)
+        m.d.sync += self.segments.eq(
+            Mux(self.proximitySelect & (self.valueNote != notes.Scale.NA),
+                proxdisplay.segments,
+                notedisplay.segments))
             
 
         return m
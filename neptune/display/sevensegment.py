@@ -21,7 +21,8 @@ A 7-segment LED display driver.
 '''
 import math
 
-from amaranth import Elaboratable, Signal, Module
+from amaranth import Elaboratable, Signal, Module, Mux
+from amaranth.hdl.mem import Memory
 from amaranth.build import Platform
 
 from neptune.display.spriteset import SpriteSet
@@ -51,16 +52,19 @@ class SevenSegment(Elaboratable):
         
         m = Module()
         
-        segMap = self.sprites.toArray()
-        
-        # by default, blank the segments
-        m.d.sync += self.segments.eq(0)
-            
-        
-        # but if the value is valid, spit the associated bitfield out 
-        # on segments        
-        with m.If(self.value < len(self.sprites)):
-            m.d.sync += self.segments.eq(segMap[self.value])
+        # the sprite table is a ROM: a Memory with a combinational read
+        # port takes the place of the Array mux, and lets synthesis map the
+        # table onto ROM/LUTRAM primitives.  The lookup is purely
+        # combinational here; whoever consumes segments registers it once
+        # (see DualSevenSegmentDisplay)
+        segRom = Memory(width=len(self.segments), depth=len(self.sprites),
+                        init=[c.value for c in self.sprites.toArray()])
+        m.submodules.seg_rom = segReadPort = segRom.read_port(domain='comb')
+        m.d.comb += [
+            segReadPort.addr.eq(self.value),
+            # invalid values blank the segments
+            self.segments.eq(Mux(self.value < len(self.sprites), segReadPort.data, 0))
+        ]
 
         return m
     
@@ -24,6 +24,20 @@ import neptune.notes as notes
 from amaranth import Const
 from neptune.display.spriteset import SpriteSet, Sprite
 
+# the sprites themselves are stateless and every instantiation of the
+# sets below wants the exact same ones, so build the templates once at
+# module scope and let the sets share them
+_noteSpriteTemplate = [
+    Sprite(notes.Scale.NA,     Const(0b00000010)), # -
+    Sprite(notes.Scale.A,      Const(0b11101110)), # A
+    Sprite(notes.Scale.B,      Const(0b00111110)), # b
+    Sprite(notes.Scale.C,      Const(0b10011100)), # C
+    Sprite(notes.Scale.D,      Const(0b01111010)), # d
+    Sprite(notes.Scale.E,      Const(0b10011110)), # E
+    Sprite(notes.Scale.F,      Const(0b10001110)), # F
+    Sprite(notes.Scale.G,      Const(0b11110110)), # g
+    ]
+
         
 class NoteSprites(SpriteSet):
     '''
@@ -31,19 +45,24 @@ class NoteSprites(SpriteSet):
     '''
         
     def __init__(self):
-        
-        notebits = [
-            Sprite(notes.Scale.NA,     Const(0b00000010)), # -
-            Sprite(notes.Scale.A,      Const(0b11101110)), # A
-            Sprite(notes.Scale.B,      Const(0b00111110)), # b
-            Sprite(notes.Scale.C,      Const(0b10011100)), # C
-            Sprite(notes.Scale.D,      Const(0b01111010)), # d
-            Sprite(notes.Scale.E,      Const(0b10011110)), # E
-            Sprite(notes.Scale.F,      Const(0b10001110)), # F
-            Sprite(notes.Scale.G,      Const(0b11110110)), # g
-            ]
-        
-        super().__init__(notebits)
+        super().__init__(_noteSpriteTemplate)
+# same module-level sharing for the proximity set; the ids are the
+# fieldsToId() packings, spelled out here as FAR HI EXACT bits
+_proxSpriteTemplate = [
+    #            FAR HI EXACT
+    # off, low, close |-|
+    Sprite(0b000, Const(0b00101010)),
+    # off, low,  far |_|
+    Sprite(0b100, Const(0b00111000)),
+    # off, high, close
+    Sprite(0b010, Const(0b01000110)),
+    # off, high, far
+    Sprite(0b110, Const(0b11000100)),
+    ]
+
+# the one sprite every exact=True id maps to
+_proxExactSprite = Sprite(0b001, Const(0b00000001))
+
         
 class ProximitySprites(SpriteSet):
     '''
@@ -68,58 +87,21 @@ class ProximitySprites(SpriteSet):
         ---
     '''
     
-    @classmethod 
+    @classmethod
     def fieldsToId(cls, exact:bool, high:bool, far:bool):
-        # a concat of bits
+        # a concat of bits, branch-free: bools are ints, just shift
+        # them into place
         # FAR HI EXACT [2 .. 0]
-        fid = 0
-        if far:
-            fid |= (1 << 2)
-        if high: 
-            fid |= (1 << 1)
-        if exact:
-            fid |= 1
-            
-        return fid
+        return (int(far) << 2) | (int(high) << 1) | int(exact)
     
     def __init__(self):
-        proxbits = [
-            #                               EXACT   HIGH   FAR
-            # off, low, close |-|
-            Sprite(
-                ProximitySprites.fieldsToId(False, False, False),
-                                                               Const(0b00101010)),
-            
-            # off, low,  far |_|
-            Sprite(
-                ProximitySprites.fieldsToId(False, False, True),
-                                                                Const(0b00111000)),
-            # off, high, close
-            Sprite(
-                ProximitySprites.fieldsToId(False, True, False),
-                                                                Const(0b01000110)),
-            # off, high, far
-            Sprite(
-                ProximitySprites.fieldsToId(False, True, True),
-                                                                Const(0b11000100)),
-            
-            # these are all the same
-            Sprite(
-                ProximitySprites.fieldsToId(True, False, False),
-                                                                Const(0b00000001)),
-            Sprite(
-                ProximitySprites.fieldsToId(True, False, True),
-                                                                Const(0b00000001)),
-            
-            Sprite(
-                ProximitySprites.fieldsToId(True, True, False),
-                                                                Const(0b00000001)),
-            Sprite(
-                ProximitySprites.fieldsToId(True, True, True),
-                                                                Const(0b00000001)),
-            
-        ]
+        super().__init__(_proxSpriteTemplate)
         
-        super().__init__(proxbits)
+        # every exact=True combination displays the same thing, so one
+        # shared Sprite (and one Const) registered under all four ids
+        # rather than four identical copies
+        for high in (False, True):
+            for far in (False, True):
+                self.add(_proxExactSprite, key=ProximitySprites.fieldsToId(True, high, far))
         
         
\ No newline at end of file
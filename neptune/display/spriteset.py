@@ -35,6 +35,7 @@ class Sprite:
         
         where * is the "dot" (which won't work in this project)
     '''
+    __slots__ = ('name', 'bits') # plenty of these little guys around: skip the per-instance dict
     def __init__(self, name:str, fieldVal:int):
         self.name = name 
         self.bits = fieldVal
@@ -51,18 +52,37 @@ class SpriteSet:
     '''
     def __init__(self, fieldsList:list=None):
         self._bitfields = dict()
-        
+        # sorted Array view, built lazily on first toArray() call --
+        # sprite sets don't change after construction, so no point
+        # re-sorting during every elaborate
+        self._arrayCache = None
+        # dense lookup table for small integer keys (the usual case:
+        # enum values and bitfield ids), so set[k] is a flat list index
+        # instead of a dict probe
+        self._table = []
+
         if fieldsList is not None and len(fieldsList):
             for f in fieldsList:
                 self.add(f)
-        
+
     def add(self, bitfield:Sprite, key=None):
         if key is None:
-            key = bitfield.name 
-            
+            key = bitfield.name
+
         self._bitfields[key] = bitfield
+        self._arrayCache = None # cached view is stale now
+        if isinstance(key, int) and 0 <= key < 64:
+            if len(self._table) <= key:
+                self._table.extend([None] * (key + 1 - len(self._table)))
+            self._table[key] = bitfield
         
     def __getitem__(self, k) -> Sprite:
+        # fast path: dense int keys index straight into the table
+        if isinstance(k, int) and 0 <= k < len(self._table):
+            sprite = self._table[k]
+            if sprite is not None:
+                return sprite
+        
         if k not in self._bitfields:
             raise KeyError(f'No such sprite defined: {str(k)}')
         
@@ -73,7 +93,11 @@ class SpriteSet:
     
     
     def toArray(self):
-        orderedByKeyList = list(sorted(self._bitfields.values(), key=lambda x: x.name))
-        asList = list(map( lambda x: x.bits, orderedByKeyList))
-        return Array(asList)
+        if self._arrayCache is None:
+            # order by registration key -- that's what __getitem__ and the
+            # hardware index use, and (unlike the sprite's own name) it
+            # stays right when one sprite is shared across several keys
+            orderedByKey = sorted(self._bitfields.items())
+            self._arrayCache = Array([s.bits for _k, s in orderedByKey])
+        return self._arrayCache
         
\ No newline at end of file
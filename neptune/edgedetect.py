@@ -102,12 +102,17 @@ class EdgeDetect(Elaboratable):
 def simulate(m:Module, dut:EdgeDetect):
     
     def clockInput(times:int, frequencyHz:int):
-        periodTime = 1/frequencyHz
+        # build the half-period delay and the two set statements once --
+        # they're immutable, so the loop can just re-yield them rather
+        # than constructing fresh objects every half cycle
+        halfPeriod = Delay(1/frequencyHz/2)
+        setHigh = dut.input.eq(1)
+        setLow = dut.input.eq(0)
         for _ in range(times):
-            yield dut.input.eq(1)
-            yield Delay(periodTime/2)
-            yield dut.input.eq(0)
-            yield Delay(periodTime/2)
+            yield setHigh
+            yield halfPeriod
+            yield setLow
+            yield halfPeriod
             
     def twoClocks():
         yield Delay(1e-4)
@@ -21,61 +21,71 @@ This module defines their values and some utils.
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
+import functools
 import math
-from enum import Enum, unique
+from enum import IntEnum, unique
+
+@functools.lru_cache(maxsize=64)
+def _frequencyToTicks(freqHz, periodIntervalSeconds:float) -> int:
+    # module-level so the cache key is just the argument pair -- during
+    # elaboration the same few combinations come up over and over
+    return math.ceil(freqHz * periodIntervalSeconds)
 
 @unique
-class ClockName(Enum):
+class ClockName(IntEnum):
     Clock1KHz = 0
     Clock2KHz = 1
     Clock4KHz = 2
     Clock3277Hz = 3 # 32.768k / 10
     
 class ClockSetting:
+    __slots__ = ('name', 'frequency')
     def __init__(self, clockOpt, freqHz:int):
         self.name = clockOpt 
         self.frequency = math.floor(freqHz)
         
 
 class ClockOptions:
-    
+
     Settings = [
          ClockSetting(ClockName.Clock1KHz, 1000),
          ClockSetting(ClockName.Clock2KHz, 2000),
          ClockSetting(ClockName.Clock4KHz, 4000),
          ClockSetting(ClockName.Clock3277Hz, 3277)
         ]
-    
-    @classmethod 
+
+    # Settings never changes after import, and the lookups below get hit
+    # repeatedly during elaboration -- so build the tables/limits once
+    # here rather than rescanning the list on every call
+    _by_name = {cs.name: cs.frequency for cs in Settings}
+    _by_value = {cs.name.value: cs.frequency for cs in Settings}
+    _maxFreq = max(cs.frequency for cs in Settings)
+    _numBits = max(0, (len(Settings) - 1).bit_length())
+
+    @classmethod
     def frequencyToTicksOver(cls, freqHz, periodIntervalSeconds:float):
-        return math.ceil(freqHz * periodIntervalSeconds)
-    
-    @classmethod 
+        return _frequencyToTicks(freqHz, periodIntervalSeconds)
+
+    @classmethod
     def num_bits_required(cls):
-        return math.ceil(math.log2(cls.num()))
-    @classmethod 
+        return cls._numBits
+    @classmethod
     def num(cls):
         return len(ClockOptions.Settings)
-    
+
     @classmethod
     def maxFrequencySupported(cls):
-        maxFreq = 0
-        for cs in ClockOptions.Settings:
-            if maxFreq < cs.frequency:
-                maxFreq = cs.frequency
-        
-        return maxFreq
-    
-    @classmethod 
+        return cls._maxFreq
+
+    @classmethod
     def frequencyHz(cls, ckey):
-        for cs in ClockOptions.Settings:
-            if ckey == cs.name:
-                return cs.frequency
-            
-            if ckey == cs.name.value:
-                return cs.frequency
-        
-        raise ValueError(f'Unknown clock {str(ckey)}')
+        freq = cls._by_name.get(ckey)
+        if freq is None:
+            freq = cls._by_value.get(ckey)
+        if freq is None:
+            raise ValueError(f'Unknown clock {str(ckey)}')
+
+        return freq
     
         
             
@@ -30,7 +30,20 @@ class DummyPlatform:
     def build(self, _doBurn:bool=False): 
         print("Don't have/can't find amaranth_boards!", file=sys.stderr)
 
-try:
-    from amaranth_boards.ice40_hx1k_blink_evn import ICE40HX1KBlinkEVNPlatform as DevPlatform
-except ModuleNotFoundError as e:
-    DevPlatform = DummyPlatform()
\ No newline at end of file
+def _resolveDevPlatform():
+    try:
+        from amaranth_boards.ice40_hx1k_blink_evn import ICE40HX1KBlinkEVNPlatform
+        return ICE40HX1KBlinkEVNPlatform
+    except ModuleNotFoundError:
+        return DummyPlatform()
+
+def __getattr__(name):
+    # DevPlatform resolved lazily: pulling in amaranth_boards means loading
+    # device definitions, and most users of this module only want the
+    # config constants above.  First access pays, then it's cached in
+    # the module globals like any other attribute.
+    if name == 'DevPlatform':
+        platform = _resolveDevPlatform()
+        globals()['DevPlatform'] = platform
+        return platform
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
\ No newline at end of file
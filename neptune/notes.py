@@ -20,10 +20,16 @@ Contains enums, classes and containers related to the frequencies of interest.
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
-from enum import Enum, unique
+from enum import Enum, IntEnum, unique
+from operator import attrgetter
 import math 
 
-class Scale(Enum):
+# C-level frequency extractor for min/max below
+_by_freq = attrgetter('frequency')
+
+# IntEnums: members compare and sort as plain ints at C level, which is
+# what the sprite-set ordering and note signals want anyway
+class Scale(IntEnum):
     NA = 0
     G = 1
     A = 2 
@@ -33,12 +39,9 @@ class Scale(Enum):
     E = 6
     F = 7
     
-    def __lt__(self, other):
-        return self.value < other.value 
-    
     
 @unique 
-class Accidental(Enum):
+class Accidental(IntEnum):
     Natural = 0
     Flat = 1
     Sharp = 2
@@ -50,6 +53,7 @@ class DetectedNote:
             - a frequency (Hz)
         along with some extras for future/debug
     '''
+    __slots__ = ('name', 'note', 'frequency', 'accidental')
     def __init__(self, name:str, note:Enum, freqHz:float, accidental:Enum=Accidental.Natural):
         self.name = name # e.g. E2
         self.note = note # Scale.E
@@ -71,36 +75,58 @@ class Tuning:
         in useful ways (e.g. in a particular order).
     '''
     def __init__(self, notes:list = None):
-        self._notes = dict()
+        # notes are held structure-of-arrays style: parallel name and
+        # frequency lists (the fields the sorts and extrema actually touch)
+        # alongside the note objects themselves, with a name->index map
+        # for the duplicate check.  Keeps traversals on flat lists rather
+        # than chasing attributes through a dict of objects
+        self._names = []
+        self._freqs = []
+        self._notesList = []
+        self._nameIndex = dict()
+        # sorted views and derived sizes are cached lazily -- tunings are
+        # built once then read many times, so don't re-sort per access
+        self._ascendingCache = None
+        self._noteBitsCache = None
         if notes is not None:
             for n in notes:
                 self.add(n)
     
     def add(self, note:DetectedNote):
-        if note.name in self._notes:
+        if note.name in self._nameIndex:
             raise ValueError(f'Note {note.name} already present in this tuning!')
         
-        self._notes[note.name] = note
+        self._nameIndex[note.name] = len(self._notesList)
+        self._names.append(note.name)
+        self._freqs.append(note.frequency)
+        self._notesList.append(note)
+        # the cached views are stale now
+        self._ascendingCache = None
+        self._noteBitsCache = None
         
     def __len__(self):
         '''
             number of notes in this tuning set
         '''
-        return len(self.note_names)
+        return len(self._notesList)
     
     
     
     @property 
     def notes(self): #  -> list[DetectedNote]:
-        return self._notes.values()
+        return self._notesList
     
     @property 
     def note_names(self): #  -> list[str]:
-        return list(self._notes.keys())
+        return self._names
     
     @property
     def ascending(self): #  -> list[DetectedNote]:
-        return list(sorted(self._notes.values(), key=lambda n: n.frequency))
+        if self._ascendingCache is None:
+            # sort indices through the flat frequency list, then map back
+            order = sorted(range(len(self._notesList)), key=self._freqs.__getitem__)
+            self._ascendingCache = [self._notesList[i] for i in order]
+        return self._ascendingCache
     
     @property 
     def descending(self): # -> list[DetectedNote]:
@@ -108,16 +134,21 @@ class Tuning:
     
     @property
     def lowest(self) -> DetectedNote:
-        return self.ascending[0]
+        # one pass, no sort
+        return min(self._notesList, key=_by_freq)
     
     @property 
     def highest(self) -> DetectedNote:
-        return self.ascending[-1]
+        return max(self._notesList, key=_by_freq)
     
     
     @property 
     def required_note_bits(self) -> int:
-        return math.ceil(math.log2(len(self)))
+        if self._noteBitsCache is None:
+            # integer bit_length rather than ceil(log2()): exact at
+            # powers of two, no float involved
+            self._noteBitsCache = max(0, (len(self) - 1).bit_length())
+        return self._noteBitsCache
     
     def __repr__(self):
         names = []
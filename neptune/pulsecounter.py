@@ -18,8 +18,9 @@ Created on Apr 12, 2023
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
+import functools
 import math
-from amaranth import Signal, Elaboratable, Module, Const, ResetSignal
+from amaranth import Signal, Elaboratable, Module, Const, ResetSignal, Array
 from amaranth.asserts import Assert, Assume, Cover
 from amaranth.build import Platform
 from amaranth.sim import Delay
@@ -31,6 +32,24 @@ from neptune.in_clock import ClockOptions, ClockName
 from neptune.sims.runner import runSimulator
 from neptune.testing.history import History
 
+
+# constant across the process -- grab it once at import rather than per
+# PulseCounter construction
+_CLOCKCONFIG_BITS = ClockOptions.num_bits_required()
+
+
+@functools.lru_cache(maxsize=None)
+def _clockTickTable(samplingDurationSeconds:float):
+    '''
+        (ClockName, tickCount) pairs for a given sampling duration.
+        Memoized at module level: repeated instantiations (parameter
+        sweeps, formal re-elaboration) share one enum walk.
+    '''
+    return tuple((c, ClockOptions.frequencyToTicksOver(ClockOptions.frequencyHz(c),
+                                                       samplingDurationSeconds))
+                 for c in ClockName)
+
+
 class PulseCounter(Elaboratable):
     '''
         PulseCounter... counts pulses.  
@@ -50,12 +69,18 @@ class PulseCounter(Elaboratable):
         self.samplingDurationSeconds = samplingDurationSeconds
         
         
+        # tick count to reach for each selectable clock, computed exactly
+        # once here -- elaborate (and anything else curious about the
+        # per-config periods) reads the dict rather than redoing the
+        # frequency arithmetic
+        self._ticksPerConfig = dict(_clockTickTable(samplingDurationSeconds))
+
         # we'll define a clock count register that is big enough to hold
-        # the highest possible (valid) clock value
-        maxClockCountPossible = ClockOptions.frequencyToTicksOver(ClockOptions.maxFrequencySupported(), 
-                                                                  samplingDurationSeconds)
-                                                                  
-        
+        # the highest clock value actually reachable through clock_config
+        # -- no point sizing for anything the config bits can't select
+        maxClockCountPossible = max(self._ticksPerConfig.values())
+
+
         self.maxClocksCount = Const(maxClockCountPossible)
         
         # synch num stages param, for embedded edge detector
@@ -66,11 +91,17 @@ class PulseCounter(Elaboratable):
         self.input = Signal()
         
         # clock configuration bits
-        self.clock_config = Signal(ClockOptions.num_bits_required())
+        self.clock_config = Signal(_CLOCKCONFIG_BITS)
         
         # how many bits can we ever need to count this clock
         self.count_bits = math.ceil(math.log2(maxClockCountPossible + 1))
         
+        # the per-config values as constants ordered by config value,
+        # ready for the indexed lookup in elaborate
+        self._ticksByConfig = [
+            Const(self._ticksPerConfig[c], self.count_bits)
+            for c in sorted(ClockName, key=int)]
+        
         # output
         # pulse count can at max ever be the highest clock count we can get to
         self.pulseCount = Signal(self.count_bits)
@@ -90,6 +121,11 @@ class PulseCounter(Elaboratable):
         singlePeriodClockCount = Signal(self.count_bits) # how many clocks to count for
         clockCount = Signal(self.count_bits) # the running clock count
         runningPulseCount = Signal(self.count_bits) # the running input pulse count from edge detector
+
+        # single-bit "period is over" flag, registered a cycle ahead of
+        # when it's consumed -- the logic below then muxes on one bit
+        # instead of dragging the wide equality into its critical path
+        terminalCount = Signal()
         
         # simple wire to tie embedded edge detector input to our input
         # this makes it basically one signal
@@ -98,16 +134,24 @@ class PulseCounter(Elaboratable):
         # we increment clock count on every singgle tick
         m.d.sync += clockCount.eq(clockCount + 1)
         
-        # how long do we keep counting?  Depends on clock config
-        with m.Switch(self.clock_config):
-            for cset in [ClockName.Clock1KHz, ClockName.Clock2KHz, 
-                         ClockName.Clock3277Hz, ClockName.Clock4KHz]:
-                with m.Case(cset):
-                    m.d.sync += singlePeriodClockCount.eq(ClockOptions.frequencyToTicksOver(ClockOptions.frequencyHz(cset), self.samplingDurationSeconds))
-                
+        # how long do we keep counting?  Depends on clock config: a
+        # straight indexed lookup into the precomputed constants -- one
+        # mux level, rather than a Switch case ladder
+        ticksLut = Array(self._ticksByConfig)
+        m.d.sync += singlePeriodClockCount.eq(ticksLut[self.clock_config])
         
+        # the flag lands in the same cycle the old compare fired:
+        # (clockCount + 1) evaluated now equals clockCount next cycle
+        m.d.sync += terminalCount.eq((clockCount + 1) == singlePeriodClockCount)
+
+        # likewise for the start of a period: true exactly when clockCount
+        # is back at 0, i.e. the cycle after the terminal count -- another
+        # one-bit enable in place of a wide zero test
+        periodStart = Signal()
+        m.d.sync += periodStart.eq(terminalCount)
+
         # check if we're done counting pulses
-        with m.If(clockCount == singlePeriodClockCount):
+        with m.If(terminalCount):
             # yes we've counted pulses long enough, report result
             m.d.sync += [
                 
@@ -117,17 +161,16 @@ class PulseCounter(Elaboratable):
                 ]
         with m.Else():
             # no, we are still counting pulses
-            with m.If(clockCount == 0):
-                # actually, we just started a new period, reset pulse count
+            with m.If(periodStart):
+                # we just started a new period, reset pulse count
                 with m.If(edgeDetector.output): # but don't miss a beat
                     m.d.sync += runningPulseCount.eq(1)
                 with m.Else():
                     m.d.sync += runningPulseCount.eq(0)
-                    
-            with m.Else():
+
+            with m.Elif(edgeDetector.output):
                 # we count any time the edge detector says 1
-                with m.If(edgeDetector.output):
-                    m.d.sync += runningPulseCount.eq(runningPulseCount + 1)
+                m.d.sync += runningPulseCount.eq(runningPulseCount + 1)
             
         return m
     
@@ -158,11 +201,16 @@ def simulate():
     def clockInput(durationSecs:float, frequencyHz:int):
         periodTime = 1/frequencyHz
         times = math.ceil(durationSecs/periodTime)
+        # loop invariants built once: same Delay and set statements
+        # re-yielded every pulse rather than thousands of fresh objects
+        half = Delay(periodTime/2)
+        setHigh = dut.input.eq(1)
+        setLow = dut.input.eq(0)
         for _ in range(times):
-            yield dut.input.eq(1)
-            yield Delay(periodTime/2)
-            yield dut.input.eq(0)
-            yield Delay(periodTime/2)
+            yield setHigh
+            yield half
+            yield setLow
+            yield half
             
     def countPulsesAt1kHz():
         # set the clock freq bits
@@ -46,6 +46,16 @@ def getSim(m:Module, clockFreq:int=DEFAULT_CLOCK_RATEHZ) -> Simulator:
 def doSimulate(sim:Simulator, baseFileName:str, runTimeSecs:float=None, traces=[]):
     print(f"Running {baseFileName} simulation")
     # sim.add_process(process) # or sim.add_sync_process(process), see below
+    if not traces:
+        # nothing to look at afterward, so skip the VCD/GTKW writing --
+        # it's a big chunk of sim wall time on long runs
+        if runTimeSecs is not None:
+            sim.run_until(runTimeSecs, run_passive=True)
+        else:
+            sim.run()
+        print("Done!")
+        return
+
     with sim.write_vcd(f"{baseFileName}.vcd", f"{baseFileName}.gtkw", traces=traces
                        ):
         # sim.run_until(runTimeSecs, run_passive=True)
@@ -53,6 +63,6 @@ def doSimulate(sim:Simulator, baseFileName:str, runTimeSecs:float=None, traces=[
             sim.run_until(runTimeSecs, run_passive=True)
         else:
             sim.run()
-    
+
     print("Done!")
     print(f"gtkwave {baseFileName}.gtkw to see results!")
\ No newline at end of file
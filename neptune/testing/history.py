@@ -4,7 +4,7 @@ Created on Apr 18, 2023
 @author: Pat Deegan
 @copyright: Copyright (C) 2023 Pat Deegan, https://psychogenic.com
 '''
-from amaranth import Elaboratable, Signal, Module, Array
+from amaranth import Elaboratable, Signal, Module, Const, Cat
 from amaranth.build import Platform
 
 class RecentPast:
@@ -58,10 +58,14 @@ class History(Elaboratable):
         return hist 
     
     def __init__(self, maxHistory:int=50):
-        self.registers = Array()
-        self.history = Array()
-        self.recentPast = Array()
+        # plain lists: these are only ever indexed with compile-time
+        # register indices, so an Array (which lowers to a dynamic mux
+        # in hardware) buys nothing here
+        self.registers = []
+        self.history = []
+        self.recentPast = []
         self.regmap = dict()
+        self.sizes = [] # cached len() of each tracked signal, by register index
         self.maxHistory = maxHistory
         self.ticks = Signal(range(self.maxHistory))
         self.usingRecentPast = False
@@ -76,6 +80,7 @@ class History(Elaboratable):
         self.history.append(sighist)
         self.registers.append(s)
         self.regmap[s.name] = regIdx
+        self.sizes.append(len(s))
         
         self.recentPast.append(RecentPast(s, self.maxHistory))
 
@@ -85,7 +90,10 @@ class History(Elaboratable):
         '''
             snapshot -- get the value of the signal at tick tickIdx
         '''
-        return self.history[self.regmap[s.name]][self.sliceStart(s, tickIdx):self.sliceEnd(s, tickIdx)]
+        regIdx = self.regmap[s.name]
+        ssize = self.sizes[regIdx]
+        start = tickIdx*ssize
+        return self.history[regIdx][start:start + ssize]
         
     def rose(self, s:Signal):
         '''
@@ -111,7 +119,9 @@ class History(Elaboratable):
         '''
             sequence -- get the value(s) of a signal over multiple ticks, all as one long blob
         '''
-        return self.history[self.regmap[s.name]][self.sliceStart(s, startTick):self.sliceEnd(s, startTick+numTicks)]
+        regIdx = self.regmap[s.name]
+        ssize = self.sizes[regIdx]
+        return self.history[regIdx][startTick*ssize:(startTick + numTicks)*ssize]
     
     def wasConstant(self, s:Signal, value:int, startTick:int, numTicks:int):
         '''
@@ -120,8 +130,15 @@ class History(Elaboratable):
             if this signal had value value for this many ticks, starting at tick x
             then ...
         '''
-        vList = [value] * numTicks
-        return self.followedSequence(s, vList, startTick, numTicks)
+        if numTicks < 1:
+            raise ValueError('Must have at least 1 tick in sequence')
+
+        # replicate the value across every slot of the span arithmetically
+        # rather than materializing a list for followedSequence to repack
+        ssize = self.sizes[self.regmap[s.name]]
+        v = int(value) & ((1 << ssize) - 1)
+        packed = v * (((1 << (ssize*numTicks)) - 1) // ((1 << ssize) - 1))
+        return self.sequence(s, startTick, numTicks) == Const(packed, ssize*numTicks)
     
     def followedSequence(self, s:Signal, values:list, startTick:int=0, numTicks:int=None):
         '''
@@ -134,67 +151,68 @@ class History(Elaboratable):
         '''
         if numTicks is None or not numTicks:
             numTicks = len(values)
-        v = None
-        vIdx = 0
-        
-        endTick = startTick+numTicks
-        if startTick >= endTick:
+        if numTicks < 1:
             raise ValueError('Must have at least 1 tick in sequence')
-            return 1
-        
-        for i in range(startTick, startTick+numTicks):
-            if v is None:
-                v = (self.snapshot(s, i) == values[vIdx])
-            else:
-                v = v & (self.snapshot(s, i) == values[vIdx])
-                
-            vIdx += 1
+        
+        # pack the expected values into one constant and compare it to the
+        # whole recorded span in a single equality -- one wide compare
+        # node instead of a chain of per-tick ANDs
+        ssize = self.sizes[self.regmap[s.name]]
+        mask = (1 << ssize) - 1
+        packed = 0
+        for i in range(numTicks):
+            packed |= (int(values[i]) & mask) << (i*ssize)
             
-        if v is None:
-            raise ValueError('History got nothing from snapshot sequence?')
-        return v
+        return self.sequence(s, startTick, numTicks) == Const(packed, ssize*numTicks)
             
     def elaborate(self, _plat:Platform):
         m = Module()
         m.d.sync += self.ticks.eq(self.ticks + 1)
         for r in range(len(self.registers)):
-            for t in range(self.maxHistory):
-                with m.If(self.ticks == t):
-                    s = self.registers[r]
-                    m.d.sync += self.history[r][
-                            self.sliceStart(s, t):self.sliceEnd(s, t)].eq(self.registers[r])
-                            
-                    if self.usingRecentPast and t:
-                        prevStep = t - 1
-                        with m.If(s):
-                            # high 
-                            m.d.sync += self.recentPast[r].fell.eq(0)
-                            with m.If(~ self.snapshot(s, prevStep)):
-                                # and was low: rose
-                                m.d.sync += self.recentPast[r].rose_trace[t].eq(1)
-                                m.d.sync += self.recentPast[r].rose.eq(1)
-                            with m.Else():
-                                m.d.sync += self.recentPast[r].rose.eq(0)
-                                
-                                
-                        with m.Else():
-                            # low 
-                            m.d.sync += self.recentPast[r].rose.eq(0)
-                            with m.If(self.snapshot(s, prevStep)):
-                                # and was high: fell
-                                m.d.sync += self.recentPast[r].fell_trace[t].eq(1)
-                                m.d.sync += self.recentPast[r].fell.eq(1)
-                            with m.Else():
-                                m.d.sync += self.recentPast[r].fell.eq(0)
-                                
-                            
-                    
-        
+            s = self.registers[r]
+            # a single write into the slot for the current tick, using a
+            # dynamically-addressed part select -- rather than a guarded
+            # assignment per possible tick value (which made this loop
+            # O(signals * maxHistory)).  Slot t still holds the value
+            # sampled at tick t, so snapshot()/sequence() indexing -- and
+            # every assertion written against them -- is unchanged
+            m.d.sync += self.history[r].word_select(self.ticks, len(s)).eq(s)
+
+        if not self.usingRecentPast:
+            # nobody consulted rose()/fell(), so don't spend a single
+            # register or mux on them -- the edge tracking below is far
+            # from free once the formal backend unrolls it
+            return m
+
+        for r in range(len(self.registers)):
+            s = self.registers[r]
+            rp = self.recentPast[r]
+            sNow = s.bool()
+            # previous state is just a one-register delayed copy of the
+            # signal -- no dynamic select into the big history register
+            sPrev = Signal()
+            sPrev.name = f'prev_{s.name}'
+            roseNow = sNow & ~sPrev
+            fellNow = ~sNow & sPrev
+            m.d.sync += [
+                sPrev.eq(sNow),
+                rp.rose.eq(roseNow),
+                rp.fell.eq(fellNow),
+                # the traces shift, newest event in bit 0
+                rp.rose_trace.eq(Cat(roseNow, rp.rose_trace[:-1])),
+                rp.fell_trace.eq(Cat(fellNow, rp.fell_trace[:-1])),
+            ]
+
         return m
     
     
         
     def sizeFor(self, s:Signal):
+        # tracked signals get the cached size; fall back to len() so the
+        # helpers still answer for signals we've never seen
+        regIdx = self.regmap.get(s.name)
+        if regIdx is not None:
+            return self.sizes[regIdx]
         return len(s)
     
     def sliceStart(self, s:Signal, tickIdx:int):
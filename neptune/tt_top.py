@@ -23,27 +23,27 @@ tying the 8 input and 8 output to appropriate places.
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
-import math 
+from enum import IntEnum
 
 
-from amaranth import Signal, Elaboratable, Module, Cat
+from amaranth import Signal, Elaboratable, Module
 from amaranth import ClockDomain, ClockSignal, ResetSignal
 from amaranth.build import Platform
-from amaranth.asserts import Assert, Assume, Cover
 
 import neptune.neptune_config as config 
 from neptune.notes import Tuning, StandardGuitarTuning
 from neptune.tuner import Neptune, inputSequenceForSignal
 from neptune.testing.history import History
 
-class PinLocations:
-    def __init__(self):
-        
-        self.clk = 0
-        self.rst = 1
-        self.clkconfig_0 = 2
-        self.clkconfig_1 = 3
-        self.input_pulses = 4
+class PinLocations(IntEnum):
+    # fixed pin map, so plain class-level constants -- usable straight
+    # off the class (including by external testbenches) without ever
+    # instantiating anything
+    clk = 0
+    rst = 1
+    clkconfig_0 = 2
+    clkconfig_1 = 3
+    input_pulses = 4
 
 class TinyTapeoutTop(Elaboratable):
     def __init__(self, usingTuning:Tuning=StandardGuitarTuning,
@@ -55,16 +55,21 @@ class TinyTapeoutTop(Elaboratable):
         self.inputSynchronizerNumStages = inputSynchronizerNumStages
         
         # TT has 8 in, 8 out
-        self.io_in = Signal(8)
-        self.io_out = Signal(8)
+        # pure combinational glue, so no reset semantics to preserve:
+        # reset_less spares the synthesizer any reset muxing on these
+        self.io_in = Signal(8, reset_less=True)
+        self.io_out = Signal(8, reset_less=True)
         
         # making it public for use in testing
-        self.tuner =  Neptune(usingTuning=self.tuning, samplingDurationSeconds=self.samplingDurationSeconds, 
+        self.tuner =  Neptune(usingTuning=self.tuning, samplingDurationSeconds=self.samplingDurationSeconds,
                         inputSynchronizerNumStages=self.inputSynchronizerNumStages)
-        
-        self.pins = PinLocations()
-        
-        self.input_pulses = Signal()
+
+        self.input_pulses = Signal(reset_less=True)
+
+        # cached elaboration result -- the formal/sim front-ends may ask
+        # for this top more than once and there's no point re-walking
+        # the whole submodule tree each time
+        self._elaborated = None
         
         
     def ports(self):
@@ -77,21 +82,27 @@ class TinyTapeoutTop(Elaboratable):
     
     @property 
     def pin_clock(self):
-        return self.inputPin(self.pins.clk)
+        return self.inputPin(PinLocations.clk)
 
     @property 
     def pin_reset(self):
-        return self.inputPin(self.pins.rst)
+        return self.inputPin(PinLocations.rst)
     
     @property 
     def pin_input_pulses(self):
-        return self.inputPin(self.pins.input_pulses)
+        return self.inputPin(PinLocations.input_pulses)
 
     def elaborate(self, platform:Platform):
+        # elaboration is pure here -- everything hangs off the single
+        # Neptune built in __init__ -- so hand back the same Module if
+        # we've already done the work
+        if self._elaborated is not None:
+            return self._elaborated
+
         m = Module()
-        
-        tuner = self.tuner 
-        
+
+        tuner = self.tuner
+
         m.submodules.tuner = tuner
         cd_sync = ClockDomain("sync")
         m.domains += cd_sync
@@ -104,47 +115,47 @@ class TinyTapeoutTop(Elaboratable):
             ResetSignal("sync").eq(self.pin_reset),
         ]
         
-        # inputs
+        # inputs -- per-bit slice assignments, no intermediate Cat node
         m.d.comb += [
-            tuner.clock_config.eq(Cat(self.io_in[self.pins.clkconfig_0], self.io_in[self.pins.clkconfig_1])),
-            tuner.input_pulses.eq(self.input_pulses)    
+            tuner.clock_config[0].eq(self.io_in[PinLocations.clkconfig_0]),
+            tuner.clock_config[1].eq(self.io_in[PinLocations.clkconfig_1]),
+            tuner.input_pulses.eq(self.input_pulses)
         ]
 
-        # Output -- all display related
-        outputs = Cat(
-            tuner.displaySegments[1:],
-            tuner.displaySelect
-            
-        )
-        
-        output_pins = self.io_out
-        assert outputs.shape() == output_pins.shape(), "inconsistent output shape"
+        # Output -- all display related, assigned straight into slices
+        # of io_out rather than through a concatenated intermediate
+        m.d.comb += [
+            self.io_out[0:7].eq(tuner.displaySegments[1:8]),
+            self.io_out[7].eq(tuner.displaySelect),
+        ]
 
-        m.d.comb += output_pins.eq(outputs)
-        
+        self._elaborated = m
         return m
 
 
 
 
 def coverAndProve(m:Module, tttop:TinyTapeoutTop, includeCovers:bool=False):
-    # Note: I have a condition below that makes the period 0.1s -- so 
+    # Note: I have a condition below that makes the period 0.1s -- so
     # during testing we only need to count a bit past 100 ticks to see results
+    # formal-only machinery imported here so merely importing this module
+    # (e.g. just to instantiate a top) doesn't pay for it
+    from amaranth.asserts import Assert, Assume, Cover
     import neptune.display.sprites as sprites
     import neptune.notes as notes
-    
+
     tuner = tttop.tuner
     
     rst = tttop.pin_reset
     m.d.comb += ResetSignal().eq(rst)
     m.d.comb += [
         Assume(~rst), # don't play with reset
-        Assume(tttop.io_in[tttop.pins.clkconfig_0] == 0), # 1 khz clock
-        Assume(tttop.io_in[tttop.pins.clkconfig_1] == 0) # 1 khz clock
+        Assume(tttop.io_in[PinLocations.clkconfig_0] == 0), # 1 khz clock
+        Assume(tttop.io_in[PinLocations.clkconfig_1] == 0) # 1 khz clock
     ]
     
     
-    numTicksUntilMeasured = math.ceil(1000 * tttop.samplingDurationSeconds) + 25 # approx
+    numTicksUntilMeasured = tuner.numSamplingTicks + 25 # approx
     
     hist = History.new(m, numTicksUntilMeasured)
     hist.track(tttop.input_pulses)
@@ -153,28 +164,28 @@ def coverAndProve(m:Module, tttop:TinyTapeoutTop, includeCovers:bool=False):
     
     notesSegs = sprites.NoteSprites()
     
-    inputSequence = inputSequenceForSignal(tuner, 330)
-    #print(len(inputSequence))
-    
     numberOfPostSampleTicksForNoteDisplay = 23
-    # giving followedSequence the entire list in one go kills it: max recursion.
-    # but break it up a bit, like so, and huzza
-    with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[:100], startTick=0)):
-        with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[100:200], startTick=100)):
-            with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[200:], startTick=200)):
-                with m.If(hist.ticks > (len(inputSequence) + 25)):
-                    m.d.comb += Assert(hist.snapshot(tttop.io_out, len(inputSequence)+numberOfPostSampleTicksForNoteDisplay)[:7] == notesSegs[notes.Scale.E].bits[:7])
-
-
-    inputSequence = inputSequenceForSignal(tuner, 112)
-    
-    # giving followedSequence the entire list in one go kills it: max recursion.
-    # but break it up a bit, like so, and huzza
-    with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[:100], startTick=0)):
-        with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[100:200], startTick=100)):
-            with m.If(hist.followedSequence(tttop.input_pulses, inputSequence[200:], startTick=200)):
-                with m.If(hist.ticks > len(inputSequence) + 25):
-                    m.d.comb += Assert(hist.snapshot(tttop.io_out, len(inputSequence)+numberOfPostSampleTicksForNoteDisplay)[:7] == notesSegs[notes.Scale.A].bits[:7])
+    # one proof block per (stimulus frequency, expected segment bits)
+    # pair -- same assertion topology for each, so drive it from a
+    # table rather than copy-pasting the block per frequency, with the
+    # sprite lookups resolved right in the table
+    expectations = [
+        (330, notesSegs[notes.Scale.E].bits),
+        (112, notesSegs[notes.Scale.A].bits)
+    ]
+    for freqHz, expectedBits in expectations:
+        inputSequence = inputSequenceForSignal(tuner, freqHz)
+        # each sequence generated exactly once and handed to
+        # followedSequence whole: it packs the expected values into a
+        # single wide equality, so no recursion limit to dodge
+        seqLen = len(inputSequence)
+        guardTick = seqLen + 25
+        displayTick = seqLen + numberOfPostSampleTicksForNoteDisplay
+        # one guard: sequence match ANDed with the tick threshold,
+        # rather than stacked m.If scopes
+        followed = hist.followedSequence(tttop.input_pulses, inputSequence, startTick=0)
+        with m.If(followed & (hist.ticks > guardTick)):
+            m.d.comb += Assert(hist.snapshot(tttop.io_out, displayTick)[:7] == expectedBits[:7])
 
 
                     
@@ -184,32 +195,41 @@ def coverAndProve(m:Module, tttop:TinyTapeoutTop, includeCovers:bool=False):
 
     
 
+def emitVerilog(dev:TinyTapeoutTop, name:str) -> str:
+    '''
+        Generate the TT-ready verilog for this top: source annotations
+        and internal attributes stripped, which cuts the output size
+        (and downstream synth parsing) way down.  Thanks to the cached
+        elaboration in TinyTapeoutTop this won't rebuild the tree if
+        the dev has already been elaborated elsewhere.
+    '''
+    from amaranth.back import verilog
+    return verilog.convert(
+        dev, name=name, ports=[dev.io_out, dev.io_in],
+        emit_src=False, strip_internal_attrs=True)
+
+
 if __name__ == "__main__":
     # Generate Verilog source for GC4.
-    from amaranth.cli import main
-    from amaranth.back import verilog
     import os
     top_name = os.environ.get("TOP", "psychogenic_neptunefixed")
 
-    Test = False 
+    Test = False
     if Test:
         samplingDurationSeconds = 0.25
     else:
         samplingDurationSeconds = config.SamplingDurationDefault
-        
+
     dev = TinyTapeoutTop(samplingDurationSeconds=samplingDurationSeconds)
-    
+
     if Test:
+        from amaranth.cli import main
         m = Module()
-        m.submodules.tt_top = dev 
+        m.submodules.tt_top = dev
         coverAndProve(m, dev, includeCovers=True)
         main(m, ports=dev.ports())
     else:
-        v = verilog.convert(
-            dev, name=top_name, ports=[dev.io_out, dev.io_in],
-            emit_src=False, strip_internal_attrs=True)
-        
-        print(v)
+        print(emitVerilog(dev, top_name))
 
         
     
@@ -21,7 +21,9 @@ coherently functioning system.
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 '''
 
+import functools
 import math
+from itertools import cycle, islice
 from amaranth import Signal, Elaboratable, Module, Cat
 from amaranth import ClockDomain, ClockSignal, ResetSignal
 
@@ -29,24 +31,62 @@ from amaranth.build import Platform
 from amaranth.build import Pins, Resource, Subsignal, Attrs
 
 
-from amaranth.sim import Delay
-from amaranth.asserts import Assert, Assume, Cover
-
 from neptune.discriminator import Discriminator
 from neptune.display.display import DualSevenSegmentDisplay
+import neptune.notes as notes
 from neptune.notes import Tuning, StandardGuitarTuning
 from neptune.pulsecounter import PulseCounter
 from neptune.in_clock import ClockOptions, ClockName
 
 
-from neptune.sims.runner import runSimulator
-from neptune.neptune_config import DevPlatform
 import neptune.neptune_config as config
 from neptune.testing.history import History
 from neptune.display.sprites import NoteSprites
 
 
 
+# these values are all specific to the iCE40HX1K dev platform I'm using.
+# Fixed pin maps, so built once at import rather than on every
+# elaboration that targets the dev board
+_pmod1 = ('pmod', 1) # j1
+_pmod2 = ('pmod', 6) # j6
+
+_DUALDISP_RESOURCE = Resource('dualdisp', 0,
+                    # these subsignals are pins 1 and 2 of the PMOD connector
+                    # not pins 1,2 of the FPGA (these are mapped in the
+                    # platform definition file), e.g. in ice40_hx1k_blink_evn it's
+                    # Connector("pmod",  1, "10  9  8  7 - -  4  3  2  1 - -"), # J1
+                    # so pin 10 and 9.
+                    Subsignal('ae', Pins('7', conn=_pmod1, dir='o')),
+                    Subsignal('af', Pins('8', conn=_pmod1, dir='o')),
+                    Subsignal('ag', Pins('9', conn=_pmod1, dir='o')),
+                    Subsignal('cathode', Pins('10', conn=_pmod1, dir='o')),
+
+
+                    Subsignal('aa', Pins('7', conn=_pmod2, dir='o')),
+                    Subsignal('ab', Pins('8', conn=_pmod2, dir='o')),
+                    Subsignal('ac', Pins('9', conn=_pmod2, dir='o')),
+                    Subsignal('ad', Pins('10', conn=_pmod2, dir='o')),
+
+
+                    # using the ice blink40, we seem to want SB_LVCMOS,
+                    # and seem to have to say it out loud:
+                    Attrs(IO_STANDARD="SB_LVCMOS")
+                )
+
+_DEVINPUTS_RESOURCE = Resource('devinputs', 0,
+                    Subsignal('signal', Pins('1', conn=_pmod1, dir='i')),
+                    Subsignal('clkconf0', Pins('2', conn=_pmod1, dir='i')),
+                    Subsignal('clkconf1', Pins('3', conn=_pmod1, dir='i')),
+                    Subsignal('extclk', Pins('4', conn=_pmod1, dir='i')),
+                    # Subsignal('reset', Pins('4', conn=_pmod1, dir='i')),
+
+                    # Subsignal('halfclock', Pins('3', conn=_pmod1, dir='o')),
+
+                    Attrs(IO_STANDARD="SB_LVCMOS")
+                    )
+
+
 class Neptune(Elaboratable):
     '''
         Neptune is our tuner/top module.
@@ -66,7 +106,11 @@ class Neptune(Elaboratable):
         self.tuning = usingTuning
         self.samplingDurationSeconds = samplingDurationSeconds
         self.inputSynchronizerNumStages = inputSynchronizerNumStages
-        
+
+        # sampling window length in ticks of the 1kHz proof/sim clock,
+        # computed once here rather than by every consumer
+        self.numSamplingTicks = math.ceil(1000 * samplingDurationSeconds)
+
         # inputs
         self.input_pulses = Signal()
         self.clock_config = Signal(ClockOptions.num_bits_required())
@@ -99,72 +143,39 @@ class Neptune(Elaboratable):
         m.submodules.display = display  
         
         
-        # hook everything up with straight-up wires (combinatorial) so 
+        # the three discriminator match bits as one named 3-bit value --
+        # shows up as a single signal in waveforms rather than an
+        # anonymous concat
+        proxim = Signal(3)
+
+        # hook everything up with straight-up wires (combinatorial) so
         # signals go to/from the right places
         m.d.comb += [
             inputPulseCounter.input.eq(self.input_pulses),
             inputPulseCounter.clock_config.eq(self.clock_config),
             discrim.edge_count.eq(inputPulseCounter.pulseCount),
             display.valueNote.eq(discrim.note),
-            display.valueProxim.eq(Cat(discrim.match_exact, discrim.match_high, discrim.match_far)),
+            proxim.eq(Cat(discrim.match_exact, discrim.match_high, discrim.match_far)),
+            display.valueProxim.eq(proxim),
             self.displaySegments.eq(display.segments),
             self.displaySelect.eq(display.proximitySelect)
-            
+
             ]
         
         
-        # can also run this to build/burn and FPGA tester
-        self.wireForPlatform(m, platform) 
-        
+        # can also run this to build/burn and FPGA tester -- guard
+        # inlined here so the usual platform-less (TT/formal/sim)
+        # elaborations skip the call entirely
+        if platform is not None and getattr(platform, 'device', None) == 'iCE40HX1K':
+            self._wireForICE40(m, platform)
+
         return m
-        
-        
-    
-    def wireForPlatform(self, m:Module, platform:Platform):
-        if platform is None or platform.device != 'iCE40HX1K':
-            return 
-        
-        # these values are all specific to the iCE40HX1K dev platform 
-        # I'm using.
-        pmod1 = ('pmod', 1) # j1
-        pmod2 = ('pmod', 6) # j6
-        
-        platform.add_resources([
-           Resource('dualdisp', 0, 
-                    # these subsignals are pins 1 and 2 of the PMOD connector
-                    # not pins 1,2 of the FPGA (these are mapped in the 
-                    # platform definition file), e.g. in ice40_hx1k_blink_evn it's
-                    # Connector("pmod",  1, "10  9  8  7 - -  4  3  2  1 - -"), # J1
-                    # so pin 10 and 9.
-                    Subsignal('ae', Pins('7', conn=pmod1, dir='o')),
-                    Subsignal('af', Pins('8', conn=pmod1, dir='o')),
-                    Subsignal('ag', Pins('9', conn=pmod1, dir='o')),
-                    Subsignal('cathode', Pins('10', conn=pmod1, dir='o')),
-                    
-                    
-                    Subsignal('aa', Pins('7', conn=pmod2, dir='o')),
-                    Subsignal('ab', Pins('8', conn=pmod2, dir='o')),
-                    Subsignal('ac', Pins('9', conn=pmod2, dir='o')),
-                    Subsignal('ad', Pins('10', conn=pmod2, dir='o')),
-                    
-                    
-                    # using the ice blink40, we seem to want SB_LVCMOS,
-                    # and seem to have to say it out loud:
-                    Attrs(IO_STANDARD="SB_LVCMOS")
-                ),
-           Resource('devinputs', 0, 
-                    Subsignal('signal', Pins('1', conn=pmod1, dir='i')),
-                    Subsignal('clkconf0', Pins('2', conn=pmod1, dir='i')),
-                    Subsignal('clkconf1', Pins('3', conn=pmod1, dir='i')),
-                    Subsignal('extclk', Pins('4', conn=pmod1, dir='i')),
-                    # Subsignal('reset', Pins('4', conn=pmod1, dir='i')),
-                    
-                    # Subsignal('halfclock', Pins('3', conn=pmod1, dir='o')),
-                    
-                    Attrs(IO_STANDARD="SB_LVCMOS")
-                    )
-        ])
-        
+
+
+
+    def _wireForICE40(self, m:Module, platform:Platform):
+        platform.add_resources([_DUALDISP_RESOURCE, _DEVINPUTS_RESOURCE])
+
         disppins = platform.request('dualdisp', 0)
         devinputs = platform.request('devinputs', 0)
         
@@ -173,56 +184,60 @@ class Neptune(Elaboratable):
         m.domains += cd_sync
  
         m.d.comb += [
-                disppins.aa.eq(self.displaySegments[7]),
-                disppins.ab.eq(self.displaySegments[6]),
-                disppins.ac.eq(self.displaySegments[5]),
-                disppins.ad.eq(self.displaySegments[4]),
-                disppins.ae.eq(self.displaySegments[3]),
-                disppins.af.eq(self.displaySegments[2]),
-                disppins.ag.eq(self.displaySegments[1]),
+                # segments ag..aa as one concat (LSB first), fed from
+                # displaySegments[1:8] in a single assignment rather
+                # than seven bit-picked ones
+                Cat(disppins.ag, disppins.af, disppins.ae,
+                    disppins.ad, disppins.ac, disppins.ab,
+                    disppins.aa).eq(self.displaySegments[1:8]),
                 disppins.cathode.eq(self.displaySelect),
-                
+
                 # the inputs
-                ClockSignal("sync").eq(devinputs.extclk), 
+                ClockSignal("sync").eq(devinputs.extclk),
                 ### ResetSignal("sync").eq(self.io_in[1]),
                 self.input_pulses.eq(devinputs.signal),
                 self.clock_config.eq(Cat(devinputs.clkconf0, devinputs.clkconf1))
-                
+
             ]
 
 
 
-def inputSequenceForSignal(tuner:Neptune, freqHz:float):
-    
-    numPulses = (tuner.samplingDurationSeconds * freqHz) + 1
-    
-    numTicks = math.ceil(1000 * tuner.samplingDurationSeconds)
-    
-    tickPeriod = numTicks/numPulses 
+@functools.lru_cache(maxsize=64)
+def _inputSequence(samplingDurationSeconds:float, freqHz:float):
+    numPulses = (samplingDurationSeconds * freqHz) + 1
+
+    numTicks = math.ceil(1000 * samplingDurationSeconds)
+
+    tickPeriod = numTicks/numPulses
     tickHalfCycle = round(tickPeriod/2.0)
-    
-    seq = []
-    tickCount = 0
-    for _i in range(numTicks):
-        if tickCount <= tickHalfCycle:
-            seq.append(1)
-        else:
-            seq.append(0)
-        
-        tickCount += 1
-        if tickCount >= tickPeriod:
-            tickCount = 0
-    
-    return seq
+
+    # the signal is exactly periodic -- the old per-tick counter reset
+    # at the first integer >= tickPeriod -- so build one period and let
+    # cycle/islice replicate it at C speed.  ceil (not round) keeps the
+    # period identical to what the counter loop produced
+    periodTicks = max(1, math.ceil(tickPeriod))
+    onePeriod = bytes(int(phase <= tickHalfCycle) for phase in range(periodTicks))
+
+    # bytes: immutable (safe to hand straight out of the cache), one
+    # byte per tick instead of a pointer to a boxed int, and iterating
+    # or indexing still yields plain 0/1 ints for followedSequence
+    return bytes(islice(cycle(onePeriod), numTicks))
+
+
+def inputSequenceForSignal(tuner:Neptune, freqHz:float):
+    # the sequence only depends on these two scalars, so the real work
+    # is memoized on them -- repeat proof-harness builds (and the same
+    # frequency across tuner and tt_top harnesses) hit the cache
+    return _inputSequence(tuner.samplingDurationSeconds, freqHz)
             
     
 
 
 def coverAndProve(m:Module, tuner:Neptune, includeCovers:bool=False):
-    # Note: I have a condition below that makes the period 0.1s -- so 
+    # Note: I have a condition below that makes the period 0.1s -- so
     # during testing we only need to count a bit past 100 ticks to see results
-    import neptune.display.sprites as sprites
-    import neptune.notes as notes
+    # formal machinery only loads when a proof harness is actually built
+    from amaranth.asserts import Assert, Assume, Cover
     rst = Signal()
     m.d.comb += ResetSignal().eq(rst)
     m.d.comb += [
@@ -231,47 +246,36 @@ def coverAndProve(m:Module, tuner:Neptune, includeCovers:bool=False):
     ]
     
     
-    numTicksUntilMeasured = math.ceil(1000 * tuner.samplingDurationSeconds) + 25 # approx
+    numTicksUntilMeasured = tuner.numSamplingTicks + 25 # approx
     
     hist = History.new(m, numTicksUntilMeasured)
     hist.track(tuner.input_pulses)
     hist.track(tuner.displaySegments)
     hist.track(tuner.displaySelect)
     
-    notesSegs = sprites.NoteSprites()
-    
-    inputSequence = inputSequenceForSignal(tuner, 330)
-    
-    
-    if False:
-        # just some testing for history rose/fell, TODO:REMOVE
-        with m.If(hist.followedSequence(tuner.input_pulses, [0, 0, 0, 1, 0, 1, 1, 1, 0, 1,0])):
-            with m.If(hist.ticks > 10):
-                with m.If(hist.rose(tuner.input_pulses)):
-                    m.d.comb += Assert(tuner.displaySegments == 22)
-                with m.Elif(hist.fell(tuner.input_pulses)):
-                    m.d.comb += Assert(tuner.displaySegments == 33)
-                
+    notesSegs = NoteSprites()
     
     numberOfPostSampleTicksForNoteDisplay = 23
-    # giving followedSequence the entire list in one go kills it: max recursion.
-    # but break it up a bit, like so, and huzza
-    with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[:100], startTick=0)):
-        with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[100:200], startTick=100)):
-            with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[200:], startTick=200)):
-                with m.If(hist.ticks > len(inputSequence) + 25):
-                    m.d.comb += Assert(hist.snapshot(tuner.displaySegments, len(inputSequence)+numberOfPostSampleTicksForNoteDisplay) == notesSegs[notes.Scale.E].bits)
-
-
-    inputSequence = inputSequenceForSignal(tuner, 112)
-    
-    # giving followedSequence the entire list in one go kills it: max recursion.
-    # but break it up a bit, like so, and huzza
-    with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[:100], startTick=0)):
-        with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[100:200], startTick=100)):
-            with m.If(hist.followedSequence(tuner.input_pulses, inputSequence[200:], startTick=200)):
-                with m.If(hist.ticks > len(inputSequence) + 25):
-                    m.d.comb += Assert(hist.snapshot(tuner.displaySegments, len(inputSequence)+numberOfPostSampleTicksForNoteDisplay) == notesSegs[notes.Scale.A].bits)
+    # identical proof block per (stimulus frequency, expected segment
+    # bits), so loop over a table of pairs rather than duplicating it --
+    # with the sprite lookups resolved right in the table.
+    # followedSequence packs the whole expected pattern into one wide
+    # equality, so the entire list goes in as a single call -- no more
+    # manual chunking to stay under the recursion limit
+    expectations = [
+        (330, notesSegs[notes.Scale.E].bits),
+        (112, notesSegs[notes.Scale.A].bits)
+    ]
+    for freqHz, expectedBits in expectations:
+        inputSequence = inputSequenceForSignal(tuner, freqHz)
+        seqLen = len(inputSequence)
+        guardTick = seqLen + 25
+        displayTick = seqLen + numberOfPostSampleTicksForNoteDisplay
+        # one guard: sequence match ANDed with the tick threshold,
+        # rather than stacked m.If scopes
+        followed = hist.followedSequence(tuner.input_pulses, inputSequence, startTick=0)
+        with m.If(followed & (hist.ticks > guardTick)):
+            m.d.comb += Assert(hist.snapshot(tuner.displaySegments, displayTick) == expectedBits)
 
 
                     
@@ -283,27 +287,39 @@ def coverAndProve(m:Module, tuner:Neptune, includeCovers:bool=False):
 
   
 def simulate():
+    # simulator bits imported here: plain imports of this module (CLI
+    # generation, formal runs) skip loading the sim machinery
+    from amaranth.sim import Delay
+    from neptune.sims.runner import runSimulator
     m = Module() # top
     m.submodules.tuner = dut = Neptune(usingTuning=StandardGuitarTuning, samplingDurationSeconds=0.5)
     
     def toggle_the_input(freqHz, tickCount=300):
-        periodSecs = 1/freqHz 
-        
+        periodSecs = 1/freqHz
+
         yield Delay(1e-3)
+        # loop invariants built once, re-yielded every cycle -- no
+        # fresh Delay/statement objects per pulse
+        half = Delay(periodSecs / 2)
+        setHigh = dut.input_pulses.eq(1)
+        setLow = dut.input_pulses.eq(0)
         for _i in range(tickCount):
-            yield dut.input_pulses.eq(1)
-            yield Delay(periodSecs / 2)
-            yield dut.input_pulses.eq(0)
-            yield Delay(periodSecs / 2)
-            
+            yield setHigh
+            yield half
+            yield setLow
+            yield half
+
     def toggle_the_input_for(atFreqHz, forTimeSecs=1.0):
-        periodSecs = 1/atFreqHz 
+        periodSecs = 1/atFreqHz
         numClicks =  math.ceil(forTimeSecs/periodSecs) + 1
+        half = Delay(periodSecs / 2)
+        setHigh = dut.input_pulses.eq(1)
+        setLow = dut.input_pulses.eq(0)
         for _i in range(numClicks):
-            yield dut.input_pulses.eq(1)
-            yield Delay(periodSecs / 2)
-            yield dut.input_pulses.eq(0)
-            yield Delay(periodSecs / 2)
+            yield setHigh
+            yield half
+            yield setLow
+            yield half
             
         
             
@@ -334,6 +350,9 @@ def simulate():
 
 
 def build(doBurn:bool=False):
+    # resolved lazily: neptune_config only goes looking for
+    # amaranth_boards the first time someone actually builds
+    from neptune.neptune_config import DevPlatform
     DevPlatform().build(
             Neptune(usingTuning=StandardGuitarTuning, 
                     samplingDurationSeconds=0.5), 